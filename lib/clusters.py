@@ -1,7 +1,8 @@
 import pickle
 import os.path
+from lib import util
 from lib.objects_to_drive import ObjectsToDrive
-from typing import Any, List
+from typing import Dict, List, Optional
 
 OUTPUT_FOLDER = "output"
 CLUSTERS_FILENAME = "clusters.pickle"
@@ -9,6 +10,9 @@ CLUSTERS_FILE = OUTPUT_FOLDER + "/" + CLUSTERS_FILENAME
 
 
 class Cluster:
+  __slots__ = ('orders', 'trackings', 'group', 'expected_cost', 'tracked_cost', 'last_ship_date',
+               'purchase_orders', 'email_ids', 'adjustment', 'to_email', 'notes', 'manual_override',
+               'non_reimbursed_trackings', 'cancelled_items', 'last_delivery_date')
 
   def __init__(self, group) -> None:
     self._initiate(set(), set(), group, 0, 0, '0', set(), set(), 0.0, [])
@@ -48,6 +52,14 @@ class Cluster:
   def __setstate__(self, state) -> None:
     self._initiate(**state)
 
+  def __reduce_ex__(self, protocol) -> tuple:
+    # Pickle the fields positionally rather than as a __dict__ of name -> value.
+    return (_reconstruct, (self.orders, self.trackings, self.group, self.expected_cost,
+                           self.tracked_cost, self.last_ship_date, self.purchase_orders,
+                           self.email_ids, self.adjustment, self.to_email, self.notes,
+                           self.manual_override, self.non_reimbursed_trackings,
+                           self.cancelled_items, self.last_delivery_date))
+
   def __str__(self) -> str:
     return "orders: %s, trackings: %s, group: %s, expected cost: %s, tracked cost: %s, last_ship_date: %s, last_delivery_date: %s, purchase_orders: %s, email_ids: %s, adjustment: %s" % (
         str(self.orders), str(self.trackings), self.group, str(self.expected_cost),
@@ -93,29 +105,50 @@ class Cluster:
     self.cancelled_items.extend(other.cancelled_items)
 
 
-def find_cluster(all_clusters, tracking) -> Any:
-  for cluster in all_clusters:
-    if cluster.orders.intersection(set(tracking.order_ids)):
-      return cluster
-  return None
+def _reconstruct(*args) -> Cluster:
+  cluster = Cluster.__new__(Cluster)
+  cluster._initiate(*args)
+  return cluster
+
+
+def _build_index(all_clusters) -> Dict[str, int]:
+  """ Maps each order ID to the position of the first cluster in all_clusters containing it. """
+  index = {}
+  for position, cluster in enumerate(all_clusters):
+    _register_orders(index, cluster.orders, position)
+  return index
+
+
+def _register_orders(index, orders, position) -> None:
+  for order in orders:
+    if index.get(order, position) >= position:
+      index[order] = position
+
+
+def find_cluster_position(index, tracking) -> Optional[int]:
+  positions = [index[order] for order in tracking.order_ids if order in index]
+  return min(positions) if positions else None
 
 
 def update_clusters(all_clusters, trackings) -> None:
+  index = _build_index(all_clusters)
   for tracking in trackings:
-    cluster = find_cluster(all_clusters, tracking)
-    if cluster is None:
-      cluster = Cluster(tracking.group)
-      all_clusters.append(cluster)
+    position = find_cluster_position(index, tracking)
+    if position is None:
+      position = len(all_clusters)
+      all_clusters.append(Cluster(tracking.group))
+    cluster = all_clusters[position]
 
     # If we are adding a new tracking or order ID, unset the manual override
     # status of the cluster.
     override_overridden = False
-    if (len(set(tracking.order_ids).difference(set(cluster.orders))) > 0 or
+    if (not cluster.orders.issuperset(tracking.order_ids) or
         tracking.tracking_number not in cluster.trackings):
       if cluster.manual_override:
         override_overridden = True
       cluster.manual_override = False
     cluster.orders.update(tracking.order_ids)
+    _register_orders(index, tracking.order_ids, position)
     cluster.trackings.add(tracking.tracking_number)
     cluster.last_ship_date = max(cluster.last_ship_date, str(tracking.ship_date))
     cluster.last_delivery_date = max(cluster.last_delivery_date, str(tracking.delivery_date))
@@ -128,76 +161,83 @@ def update_clusters(all_clusters, trackings) -> None:
 def merge_orders(clusters) -> list:
   """ Merges together orders that share a common purchase order or email ID. """
   print("Merging clusters by PO or email ID")
-  while True:
-    prev_length = len(clusters)
-    clusters = run_merge_iteration(clusters)
-    if len(clusters) == prev_length:
-      break
-  return clusters
+  # Union-find over cluster positions; the root of each set is its lowest position. Members are
+  # merged into the root in list order, so concatenated notes and cancelled_items follow list
+  # order too (e.g. "A, B, C"), where the old pairwise sweeps could give "A, C, B".
+  parents = list(range(len(clusters)))
+  first_positions = {}
+  for position, cluster in enumerate(clusters):
+    for key in _shared_attr_keys(cluster):
+      other_position = first_positions.setdefault(key, position)
+      root = _find_root(parents, position)
+      other_root = _find_root(parents, other_position)
+      if root == other_root:
+        continue
+      if key[0] == 'po':
+        print(f'Merged orders {cluster.orders} and {clusters[other_position].orders} '
+              f'by common PO {key[2]}')
+      parents[max(root, other_root)] = min(root, other_root)
 
-
-def run_merge_iteration(clusters) -> list:
   result = []
-  for cluster in clusters:
-    to_merge = find_by_shared_attr(cluster, result)
-    if to_merge:
-      to_merge.merge_with(cluster)
-    else:
+  for position, cluster in enumerate(clusters):
+    root = _find_root(parents, position)
+    if root == position:
       result.append(cluster)
+    else:
+      clusters[root].merge_with(cluster)
   return result
 
 
-def find_by_shared_attr(cluster, all_clusters) -> Any:
-  if not cluster.purchase_orders and not cluster.email_ids:
-    return None
+def _shared_attr_keys(cluster) -> list:
+  return ([('po', cluster.group, po) for po in cluster.purchase_orders] +
+          [('email', cluster.group, email_id) for email_id in cluster.email_ids])
+
 
-  for candidate in all_clusters:
-    if candidate.group == cluster.group:
-      common_pos = candidate.purchase_orders.intersection(cluster.purchase_orders)
-      if common_pos:
-        print(f'Merged orders {cluster.orders} and {candidate.orders} by common POs {common_pos}')
-        return candidate
-      common_emails = candidate.email_ids.intersection(cluster.email_ids)
-      if common_emails:
-        return candidate
+def _find_root(parents, position) -> int:
+  while parents[position] != position:
+    parents[position] = parents[parents[position]]
+    position = parents[position]
+  return position
 
-  return None
+
+def from_rows(header, rows) -> List[Cluster]:
+  index = util.build_header_index(header)
+  return [_from_indexed_row(index, row) for row in rows]
 
 
 def from_row(header, row) -> Cluster:
-  if 'Orders' in header:
-    orders = set([o.strip() for o in str(row[header.index('Orders')]).split(',')])
-  else:
-    orders = set()
+  return _from_indexed_row(util.build_header_index(header), row)
+
+
+def _split_set(value) -> set:
+  """ Splits a comma-separated sheet cell into a set of stripped values; blank gives empty. """
+  value = value if isinstance(value, str) else str(value)
+  return {s.strip() for s in value.split(',')} if value else set()
+
 
-  if 'Trackings' in header:
-    trackings = set([t.strip() for t in str(row[header.index('Trackings')]).split(',')])
-  else:
-    trackings = set()
+def _from_indexed_row(index, row) -> Cluster:
+  orders = _split_set(row[index['Orders']]) if 'Orders' in index else set()
+  trackings = _split_set(row[index['Trackings']]) if 'Trackings' in index else set()
 
-  expected_cost_str = row[header.index('Amount Billed')] if 'Amount Billed' in header else ''
+  expected_cost_str = row[index['Amount Billed']] if 'Amount Billed' in index else ''
   expected_cost = float(expected_cost_str) if expected_cost_str else 0.0
-  tracked_cost_str = row[header.index("Amount Reimbursed")] if "Amount Reimbursed" in header else ''
+  tracked_cost_str = row[index["Amount Reimbursed"]] if "Amount Reimbursed" in index else ''
   tracked_cost = float(tracked_cost_str) if tracked_cost_str else 0.0
-  non_reimbursed_str = str(
-      row[header.index("Non-Reimbursed Trackings")]) if "Non-Reimbursed Trackings" in header else ""
-  non_reimbursed_trackings = set([t.strip() for t in non_reimbursed_str.split(',')
-                                 ]) if non_reimbursed_str else set()
-  last_ship_date = row[header.index('Last Ship Date')] if 'Last Ship Date' in header else '0'
-  last_delivery_date = row[header.index(
-      'Last Delivery Date (Est.)')] if 'Last Delivery Date (Est.)' in header else ''
-  pos_string = str(row[header.index('POs')]) if 'POs' in header else ''
-  pos = set([s.strip() for s in pos_string.split(',')]) if pos_string else set()
+  non_reimbursed_trackings = _split_set(
+      row[index["Non-Reimbursed Trackings"]]) if "Non-Reimbursed Trackings" in index else set()
+  last_ship_date = row[index['Last Ship Date']] if 'Last Ship Date' in index else '0'
+  last_delivery_date = row[index[
+      'Last Delivery Date (Est.)']] if 'Last Delivery Date (Est.)' in index else ''
+  pos = _split_set(row[index['POs']]) if 'POs' in index else set()
   email_ids = set()  # Set this if we want email IDs in the Sheet
-  group = row[header.index('Group')] if 'Group' in header else ''
-  adj_string = row[header.index(
-      "Manual Cost Adjustment")] if "Manual Cost Adjustment" in header else ''
+  group = row[index['Group']] if 'Group' in index else ''
+  adj_string = row[index["Manual Cost Adjustment"]] if "Manual Cost Adjustment" in index else ''
   adjustment = float(adj_string) if adj_string else 0.0
-  manual_override = row[header.index('Manual Override')] if 'Manual Override' in header else False
-  to_email = row[header.index('To Email')] if 'To Email' in header else ''
-  notes = str(row[header.index('Notes')]) if 'Notes' in header else ''
+  manual_override = row[index['Manual Override']] if 'Manual Override' in index else False
+  to_email = row[index['To Email']] if 'To Email' in index else ''
+  notes = str(row[index['Notes']]) if 'Notes' in index else ''
   cancelled_items_str = str(
-      row[header.index("Cancelled Items")]) if "Cancelled Items" in header else ""
+      row[index["Cancelled Items"]]) if "Cancelled Items" in index else ""
   cancelled_items = [i.strip() for i in cancelled_items_str.split(',')
                     ] if cancelled_items_str else []
   cluster = Cluster(group)
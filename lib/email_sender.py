@@ -20,18 +20,18 @@ class EmailSender:
     for tracking in trackings:
       groups_dict[tracking.group].append(tracking)
 
-    content = "Tracking number / order number(s) per group:\n\n"
+    lines = ["Tracking number / order number(s) per group:", ""]
     for group, trackings in groups_dict.items():
-      numbers = [
+      lines.append(f"{group} ({len(trackings)}):")
+      lines.extend(
           f"{tracking.tracking_number} / {', '.join(tracking.order_ids)} / {tracking.to_email} / {tracking.items}"
-          for tracking in trackings
-      ]
-      content += f"{group} ({len(numbers)}):\n"
-      content += '\n'.join(numbers)
-      content += '\n\n'
-
-    content += "These are the new tracking numbers that we have found. See the Google Sheet for all tracking numbers."
-    return content
+          for tracking in trackings)
+      lines.append("")
+
+    lines.append(
+        "These are the new tracking numbers that we have found. See the Google Sheet for all tracking numbers."
+    )
+    return "\n".join(lines)
 
   def send_email_content(self, subject, content, recipients=[]) -> None:
     recipients = recipients if recipients else [self.email_config['username']]
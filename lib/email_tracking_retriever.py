@@ -2,6 +2,7 @@ import base64
 import datetime
 import email
 import imaplib
+import re
 import socket
 from abc import ABC, abstractmethod
 from typing import Any, Callable, Optional, Tuple, TypeVar, Dict, List
@@ -15,6 +16,7 @@ from lib.tracking import Tracking
 _FuncT = TypeVar('_FuncT', bound=Callable)
 
 BASE_64_FLAG = 'Content-Transfer-Encoding: base64'
+FETCH_UID_REGEX = re.compile(rb'UID (\d+)')
 TODAY = datetime.date.today().strftime('%Y-%m-%d')
 MAX_ATTEMPTS = 4
 
@@ -254,7 +256,38 @@ class EmailTrackingRetriever(ABC):
 
 def get_email_content(email_id, mail) -> str:
   result, data = mail.uid("FETCH", email_id, "(RFC822)")
-  email_str = data[0][1].decode('utf-8')
+  return decode_email_content(data[0][1])
+
+
+def get_email_contents(email_ids, mail) -> List[str]:
+  """Fetches the given emails with a single UID FETCH, in the order of email_ids.
+
+  Falls back to fetching one-by-one for any email missing from the bulk response (or for all
+  of them if the server rejects the bulk command).
+  """
+  if not email_ids:
+    return []
+  contents_by_id = {}
+  try:
+    result, data = mail.uid("FETCH", ",".join(email_ids), "(RFC822)")
+    if result == 'OK':
+      for part in data:
+        # each message comes back as (b'<seq> (UID <uid> RFC822 {<size>}', b'<body>')
+        if isinstance(part, tuple):
+          match = FETCH_UID_REGEX.search(part[0])
+          if match:
+            contents_by_id[match.group(1).decode('utf-8')] = decode_email_content(part[1])
+  except imaplib.IMAP4.error:
+    print("Bulk email fetch failed, falling back to fetching one at a time")
+  return [
+      contents_by_id[email_id]
+      if email_id in contents_by_id else get_email_content(email_id, mail)
+      for email_id in email_ids
+  ]
+
+
+def decode_email_content(raw_email: bytes) -> str:
+  email_str = raw_email.decode('utf-8')
   # sometimes it's base64 decoded and we need to handle that
   if BASE_64_FLAG in email_str:
     # this is messy, but so is base64 / the email format so yeah
@@ -1,17 +1,25 @@
 import asyncio
+import base64
 import collections
+import concurrent.futures
 import email
+import os
 import re
+import shelve
 import sys
 import time
 import traceback
 from typing import Any, Tuple, Dict, Set, List
 
 import aiohttp
+import orjson
 import requests
-from bs4 import BeautifulSoup, Tag
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.support.ui import Select
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import Select, WebDriverWait
 from tqdm import tqdm
 
 import lib.email_auth as email_auth
@@ -26,6 +34,7 @@ SUBMIT_BUTTON_SELECTOR = "//*[contains(text(), 'SUBMIT')]"
 
 RESULT_SELECTOR = "//*[contains(text(), 'record(s) effected')]"
 RESULT_REGEX = r"(\d+) record\(s\) effected"
+PASSCODE_REGEX = re.compile(r'Passcode for .*(\d{3}-\d{3})')
 
 BASE_URL_FORMAT = "https://%s.com"
 MANAGEMENT_URL_FORMAT = "https://www.%s.com/p/it@orders-all/"
@@ -41,9 +50,57 @@ USA_PO_URL = "https://usabuying.group/purchase-orders"
 USA_API_LOGIN_URL = "https://api.usabuying.group/index.php/buyers/login"
 USA_API_TRACKINGS_URL = "https://api.usabuying.group/index.php/buyers/trackings"
 
+USA_MAX_CONCURRENT_REQUESTS = 32
+USA_ENTRIES_PAGE_SIZE = 100
+# Used when the login token carries no readable expiry.
+USA_TOKEN_DEFAULT_TTL_SECONDS = 3600
+USA_TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+OUTPUT_FOLDER = "output"
+USA_PRICE_CACHE_FILE = OUTPUT_FOLDER + "/usa_tracking_prices"
+
 YRCW_URL = "https://app.yrcwtech.com/"
 
+# Reading tables cell-by-cell costs a WebDriver round trip per cell, so these scripts serialize
+# the needed cell text in a single call instead.
+YRCW_TABLE_ROWS_SCRIPT = """
+const body = document.getElementById('nav-home').querySelector('table').querySelector('tbody');
+return Array.from(body.querySelectorAll('tr'))
+  .map(tr => tr.querySelectorAll('td'))
+  .filter(tds => tds.length > 1)  // there's a ghost <tr> at the end
+  .map(tds => [tds[1].innerText.trim(), tds[4].innerText.trim()]);
+"""
+MELUL_ROW_SELECTOR = "tbody[class='md-body'] tr"
+MELUL_NEXT_BUTTON_SELECTOR = "button[ng-click='$pagination.next()']"
+MELUL_FIRST_ROW_SCRIPT = f'return document.querySelector("{MELUL_ROW_SELECTOR}");'
+MELUL_TABLE_PAGE_SCRIPT = """
+const body = document.querySelector("tbody[class='md-body']");
+const nextButton = document.querySelector("%s");
+return {
+  rows: body === null ? [] : Array.from(body.querySelectorAll('tr')).map(tr => {
+    const tds = tr.querySelectorAll('td');
+    const verified = tds[4].querySelector('md-checkbox.md-checked') !== null;
+    return [verified, tds[5].innerText.trim(), tds[14].innerText.trim(), tds[15].innerText.trim(),
+            tds[17].innerText.trim()];
+  }),
+  firstRow: body === null ? null : body.querySelector('tr'),
+  hasNext: nextButton !== null && !nextButton.disabled
+};
+""" % MELUL_NEXT_BUTTON_SELECTOR
+MELUL_NEXT_PAGE_SCRIPT = f'document.querySelector("{MELUL_NEXT_BUTTON_SELECTOR}").click();'
+
 MAX_UPLOAD_ATTEMPTS = 10
+WAIT_TIMEOUT_SECONDS = 15
+
+MELUL_TWO_FACTOR_TEXT = "Authentication required"
+# There's no known marker for a finished login without 2FA, so that path waits this long for
+# the 2FA view before assuming it isn't coming.
+MELUL_TWO_FACTOR_WAIT_SECONDS = 3
+
+BFMR_FETCH_BATCH_SIZE = 200
+
+# Only build the tree under the payment table cell; the rest of a BFMR email is never read.
+BFMR_EMAIL_BODY = SoupStrainer('td', id='email_body')
 
 
 def fill_busted_bfmr_costs(result: Dict[str, float], tracking_map: Dict[str, str], table: Tag):
@@ -56,7 +113,7 @@ def fill_busted_bfmr_costs(result: Dict[str, float], tracking_map: Dict[str, str
   for i in range(len(tds) // 5):
     tracking = tds[i * 5].getText().upper().strip()
     total_text = tds[i * 5 + 4].getText()
-    total = float(total_text.replace(',', '').replace('$', ''))
+    total = float(total_text.translate(util.MONEY_CHARS_TABLE))
     result[tracking] += total
     tracking_map[tracking] = tracking
 
@@ -68,11 +125,46 @@ def fill_standard_bfmr_costs(result: Dict[str, float], tracking_map: Dict[str, s
     if len(tds) != 5:
       continue
     tracking = tds[0].getText().upper().strip()
-    total = float(tds[4].getText().strip().replace(',', '').replace('$', ''))
+    total = float(tds[4].getText().strip().translate(util.MONEY_CHARS_TABLE))
     result[tracking] += total
     tracking_map[tracking] = tracking
 
 
+def parse_bfmr_email(email_str: str) -> Tuple[Dict[str, float], Dict[str, str]]:
+  """
+  Parses a single BFMR payment email into (tracking -> cost, tracking -> tracking) maps.
+  This is a top-level function so that it can run in a worker process.
+  """
+  result = collections.defaultdict(float)
+  tracking_map = dict()
+  email_str = email_tracking_retriever.clean_email_content(email_str)
+  soup = BeautifulSoup(email_str, features="html.parser", parse_only=BFMR_EMAIL_BODY)
+
+  body = soup.find('td', id='email_body')
+  if not body:
+    return result, tracking_map
+  tables = body.find_all('table')
+  if not tables or len(tables) < 2:
+    return result, tracking_map
+  table = tables[1]
+  fill_busted_bfmr_costs(result, tracking_map, table)
+  if not result:
+    # Busted tables nest every row inside the previous one, so the standard pass would re-walk
+    # the same cells once per row without ever finding a five-cell row. Only run it otherwise.
+    fill_standard_bfmr_costs(result, tracking_map, table)
+  return result, tracking_map
+
+
+def _get_token_expiry(token) -> float:
+  """ Returns the "exp" claim of a JWT, or a default lifetime from now if there isn't one. """
+  try:
+    payload = token.split('.')[1]
+    exp = orjson.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['exp']
+    return float(exp)
+  except Exception:
+    return time.time() + USA_TOKEN_DEFAULT_TTL_SECONDS
+
+
 class GroupSiteManager:
 
   def __init__(self, config, driver_creator) -> None:
@@ -80,6 +172,11 @@ class GroupSiteManager:
     self.driver_creator = driver_creator
     self.melul_portal_groups = config['melulPortals']
     self.archive_manager = ArchiveManager(config)
+    # Reuse one keep-alive connection pool for the synchronous USA API calls.
+    self.usa_session = requests.Session()
+    self.usa_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    self.usa_token = None
+    self.usa_token_expiry = 0.0
 
   def upload(self, trackings) -> None:
     groups_dict = collections.defaultdict(list)
@@ -137,7 +234,12 @@ class GroupSiteManager:
       return trackings_cost, po_cost
     elif group == "usa":
       print("Loading group usa")
-      return asyncio.run(self._get_usa_tracking_pos_prices(known_trackings))
+      try:
+        return asyncio.run(self._get_usa_tracking_pos_prices(known_trackings))
+      except Exception:
+        # The server may have rejected the cached token; make the retry log in again
+        self._reset_usa_token()
+        raise
     elif group == "yrcw":
       print("Loading yrcw")
       return self._get_yrcw_tracking_pos_prices()
@@ -171,86 +273,136 @@ class GroupSiteManager:
       time.sleep(10)
 
       # next load the actual data
-      nav_home = driver.find_element_by_id('nav-home')
-      table = nav_home.find_element_by_tag_name('table')
-      body = table.find_element_by_tag_name('tbody')
-      rows = body.find_elements_by_tag_name('tr')
-      for row in rows:
-        tds = row.find_elements_by_tag_name('td')
-        if len(tds) > 1:  # there's a ghost <tr> at the end
-          tracking = tds[1].text.upper().strip()
-          # Something screwy is going on here with USPS labels.
-          # Strip the first 8 chars
-          if len(tracking) == 30:
-            tracking = tracking[8:]
-          value = float(tds[4].text.replace('$', '').replace(',', ''))
-          tracking_cost_map[(tracking,)] += value
-          po_cost_map[tracking] += value
+      for tracking_text, value_text in driver.execute_script(YRCW_TABLE_ROWS_SCRIPT):
+        tracking = tracking_text.upper().strip()
+        # Something screwy is going on here with USPS labels.
+        # Strip the first 8 chars
+        if len(tracking) == 30:
+          tracking = tracking[8:]
+        value = float(value_text.translate(util.MONEY_CHARS_TABLE))
+        tracking_cost_map[(tracking,)] += value
+        po_cost_map[tracking] += value
     finally:
       driver.quit()
     return tracking_cost_map, po_cost_map
 
   def _get_usa_login_headers(self):
-    group_config = self.config['groups']['usa']
-    creds = {"credentials": group_config['username'], "password": group_config['password']}
-    response = requests.post(url=USA_API_LOGIN_URL, data=creds)
-    token = response.json()['data']['token']
-    return {"Authorization": f"Bearer {token}"}
-
-  def _get_usa_tracking_entries(self, headers):
-    result = []
-    start = 0
+    # Only log in again once the cached token is about to expire.
+    refresh_time = self.usa_token_expiry - USA_TOKEN_REFRESH_MARGIN_SECONDS
+    if self.usa_token is None or time.time() >= refresh_time:
+      group_config = self.config['groups']['usa']
+      creds = {"credentials": group_config['username'], "password": group_config['password']}
+      response = self.usa_session.post(url=USA_API_LOGIN_URL, data=creds)
+      self.usa_token = orjson.loads(response.content)['data']['token']
+      self.usa_token_expiry = _get_token_expiry(self.usa_token)
+    return {"Authorization": f"Bearer {self.usa_token}"}
+
+  def _reset_usa_token(self) -> None:
+    self.usa_token = None
+    self.usa_token_expiry = 0.0
+
+  async def _get_usa_tracking_entries(self, session, semaphore):
+    # The first page tells us how many entries there are; then fetch the rest concurrently.
+    first_page = await self._get_usa_tracking_entries_page(session, semaphore, 0)
+    total_items = first_page['totals']['items']
+    other_pages = await asyncio.gather(*[
+        self._get_usa_tracking_entries_page(session, semaphore, start)
+        for start in range(USA_ENTRIES_PAGE_SIZE, total_items, USA_ENTRIES_PAGE_SIZE)
+    ])
+    result = list(first_page['data'])
+    for page in other_pages:
+      result.extend(page['data'])
+    return result
+
+  async def _get_usa_tracking_entries_page(self, session, semaphore, start):
     params = {
         "date_from": "",
         "date_until": "",
         "tracking_number": "",
         "receiving_status_id": "1",
-        "limit": "100",
-        "start": start
+        "limit": str(USA_ENTRIES_PAGE_SIZE),
+        "start": str(start)
     }
-    while True:
-      params['start'] = start
-      json_result = requests.get(url=USA_API_TRACKINGS_URL, headers=headers, params=params).json()
-      total_items = json_result['totals']['items']
-      result.extend(json_result['data'])
-      start += 100
-      if start >= total_items:
-        break
-    return result
+    async with semaphore:
+      response = await session.get(USA_API_TRACKINGS_URL, params=params)
+      response.raise_for_status()
+      return orjson.loads(await response.read())
 
-  async def _retrieve_usa_tracking_price(self, tracking_number, session, tracking_tuples_to_prices):
+  async def _retrieve_usa_tracking_price(self, tracking_number, session, semaphore,
+                                         tracking_tuples_to_prices):
     try:
-      response = await session.request(
-          method="GET", url=f"{USA_API_TRACKINGS_URL}/{tracking_number}")
-      response.raise_for_status()
-      json = await response.json()
+      async with semaphore:
+        response = await session.request(
+            method="GET", url=f"{USA_API_TRACKINGS_URL}/{tracking_number}")
+        response.raise_for_status()
+        json = orjson.loads(await response.read())
       cost = float(json['data']['box']['total_price'])
       tracking_tuples_to_prices[(tracking_number,)] = cost
     except Exception as e:
+      if isinstance(e, aiohttp.ClientResponseError) and e.status == 401:
+        self._reset_usa_token()
       print(f"Error finding USA tracking cost for {tracking_number}")
       print(e)
 
   async def _get_usa_tracking_pos_prices(self, known_trackings: Set[Tuple[str]]):
     headers = self._get_usa_login_headers()
-    pos_to_prices = {}
-    all_entries = self._get_usa_tracking_entries(headers)
-    for entry in all_entries:
-      pos_to_prices[entry['purchase_id']] = float(entry['purchase']['amount'])
-    tracking_numbers = [entry['tracking_number'] for entry in all_entries]
-    tracking_numbers = [t for t in tracking_numbers if (t,) not in known_trackings]
-    async with aiohttp.ClientSession(headers=headers) as session:
-      tracking_tuples_to_prices = {}
-      tasks = []
-      for tracking_number in tracking_numbers:
-        tasks.append(
-            self._retrieve_usa_tracking_price(tracking_number, session, tracking_tuples_to_prices))
-      await asyncio.gather(*tasks)
+    # Cap in-flight requests and reuse pooled keep-alive connections rather than opening one
+    # connection per request.
+    connector = aiohttp.TCPConnector(
+        limit=USA_MAX_CONCURRENT_REQUESTS,
+        limit_per_host=USA_MAX_CONCURRENT_REQUESTS,
+        ttl_dns_cache=300,
+        keepalive_timeout=30)
+    semaphore = asyncio.Semaphore(USA_MAX_CONCURRENT_REQUESTS)
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+      pos_to_prices = {}
+      all_entries = await self._get_usa_tracking_entries(session, semaphore)
+      for entry in all_entries:
+        pos_to_prices[entry['purchase_id']] = float(entry['purchase']['amount'])
+      tracking_numbers = [entry['tracking_number'] for entry in all_entries]
+      tracking_numbers = [t for t in tracking_numbers if (t,) not in known_trackings]
+
+      # Prices of received trackings don't change, so only look up ones we haven't priced before.
+      price_cache = self._open_usa_price_cache()
+      try:
+        tracking_tuples_to_prices = {}
+        fetched_prices = {}
+        tasks = []
+        for tracking_number in tracking_numbers:
+          if tracking_number in price_cache:
+            tracking_tuples_to_prices[(tracking_number,)] = price_cache[tracking_number]
+          else:
+            tasks.append(
+                self._retrieve_usa_tracking_price(tracking_number, session, semaphore,
+                                                  fetched_prices))
+        await asyncio.gather(*tasks)
+        for (tracking_number,), cost in fetched_prices.items():
+          price_cache[tracking_number] = cost
+        tracking_tuples_to_prices.update(fetched_prices)
+      finally:
+        price_cache.close()
       return tracking_tuples_to_prices, pos_to_prices
 
+  def _open_usa_price_cache(self) -> Any:
+    if not self.config.get('cacheUsaTrackingPrices', True):
+      # A throwaway dict-like cache, so that nothing persists between runs.
+      return shelve.Shelf({})
+    if not os.path.exists(OUTPUT_FOLDER):
+      os.mkdir(OUTPUT_FOLDER)
+    return shelve.open(USA_PRICE_CACHE_FILE)
+
   def _upload_usa(self, numbers) -> None:
     headers = self._get_usa_login_headers()
     data = {"trackings": ",".join(numbers)}
-    requests.post(url=USA_API_TRACKINGS_URL, headers=headers, data=data)
+    try:
+      response = self.usa_session.post(url=USA_API_TRACKINGS_URL, headers=headers, data=data)
+    except Exception:
+      self._reset_usa_token()
+      raise
+    if response.status_code == 401:
+      # The cached token was rejected; log in again on the next attempt
+      self._reset_usa_token()
+      response.raise_for_status()
 
   def _melul_get_tracking_pos_costs_maps(
       self, group: str, username: str, password: str, known_trackings: Set[Tuple[str]],
@@ -261,40 +413,38 @@ class GroupSiteManager:
       po_to_cost_map: Dict[str, float] = {}
       trackings_to_cost_map: Dict[Tuple[str], float] = {}
 
-      # Clear the search field since it can cache results
-      search_button = driver.find_element_by_class_name('pf-search-button')
+      # Clear the search field since it can cache results. The grid renders after the document
+      # has loaded, so wait for its search control (which is there even when there are no rows).
+      search_button = WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+          expected_conditions.element_to_be_clickable((By.CLASS_NAME, 'pf-search-button')))
       search_button.click()
-      time.sleep(1)
-      driver.find_element_by_xpath('//button[@title="Clear filters"]').click()
-      time.sleep(1)
-      driver.find_element_by_xpath('//md-icon[text()="last_page"]').click()
-      time.sleep(4)
+      clear_filters_button = WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+          expected_conditions.element_to_be_clickable(
+              (By.XPATH, '//button[@title="Clear filters"]')))
+      # Rows may still be loading here; an empty grid is only final once the filters are cleared.
+      self._click_and_wait_for_new_melul_rows(driver, clear_filters_button, 4)
+      self._click_and_wait_for_new_melul_rows(
+          driver, driver.find_element_by_xpath('//md-icon[text()="last_page"]'), 4)
 
       # go to the first page (page selection can get a bit messed up with the multiple sites)
       # use a list to avoid throwing an exception (don't fail if there's only one page)
       first_page_buttons = driver.find_elements_by_xpath(
           "//button[@ng-click='$pagination.first()']")
       if first_page_buttons:
-        first_page_buttons[0].click()
-        time.sleep(4)
+        self._click_and_wait_for_new_melul_rows(driver, first_page_buttons[0], 4)
 
       with tqdm(desc=f"Fetching {group} check-ins", unit='page') as pbar:
         while True:
-          table = driver.find_element_by_xpath("//tbody[@class='md-body']")
-          rows = table.find_elements_by_tag_name('tr')
-          for row in rows:
-            tds = row.find_elements_by_tag_name('td')
-            verified_checkbox = tds[4].find_element_by_tag_name('md-checkbox')
-            verified = 'md-checked' in verified_checkbox.get_attribute('class')
-            po = str(tds[5].text)
-            cost = tds[14].text.replace('$', '').replace(',', '')
-            trackings: List[str] = tds[15].text.replace('-', '').split(",")
+          # One round trip per page: the rows, plus what we need to move on to the next page
+          page = driver.execute_script(MELUL_TABLE_PAGE_SCRIPT)
+          for verified, po, cost_text, trackings_text, modified_date in page['rows']:
+            cost = cost_text.translate(util.MONEY_CHARS_TABLE)
+            trackings: List[str] = trackings_text.replace('-', '').split(",")
 
             if trackings:
               tracking_tuple = tuple(
                   [tracking.strip() for tracking in trackings if tracking and tracking.strip()])
               # break out of this if we've seen this already, we're past a month, and we're not running --full
-              modified_date = str(tds[17].text)
               not_recent = 'month' in modified_date or 'year' in modified_date
               if tracking_tuple in known_trackings and not full and not_recent:
                 return po_to_cost_map, trackings_to_cost_map
@@ -304,11 +454,12 @@ class GroupSiteManager:
             if cost and po:
               po_to_cost_map[po] = po_to_cost_map.get(po, 0.0) + float(cost)
 
-          next_page_buttons = driver.find_elements_by_xpath(
-              "//button[@ng-click='$pagination.next()']")
-          if next_page_buttons and not next_page_buttons[0].get_property("disabled"):
-            next_page_buttons[0].click()
-            time.sleep(3)
+          if page['hasNext']:
+            driver.execute_script(MELUL_NEXT_PAGE_SCRIPT)
+            if page['firstRow'] is not None:
+              self._wait_for_staleness(driver, page['firstRow'], 3)
+            # The old rows going stale doesn't mean the new ones have rendered yet
+            self._wait_for_melul_rows(driver, WAIT_TIMEOUT_SECONDS)
             pbar.update()
           else:
             break
@@ -343,7 +494,47 @@ class GroupSiteManager:
 
   def _load_page(self, driver, url) -> None:
     driver.get(url)
-    time.sleep(3)
+    WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+        expected_conditions.presence_of_element_located((By.TAG_NAME, 'body')))
+
+  def _click_and_wait_for_staleness(self, driver, element, timeout) -> None:
+    """
+    Clicks the element and waits until it's detached from the DOM, i.e. until the page has
+    navigated or re-rendered. The timeout is an upper bound (the fixed sleep this replaces);
+    if the element is still attached by then, carry on anyway.
+    """
+    element.click()
+    self._wait_for_staleness(driver, element, timeout)
+
+  def _click_and_wait_for_new_melul_rows(self, driver, element, timeout) -> None:
+    """
+    Clicks a Melul grid control (filters, pagination) and waits for the rows on the current
+    page to be replaced, for at most the given timeout (e.g. if the click didn't change pages).
+    Then waits, again for at most the timeout, for the new rows to render (an empty grid never
+    gets any).
+    """
+    first_row = driver.execute_script(MELUL_FIRST_ROW_SCRIPT)
+    element.click()
+    if first_row is not None:
+      self._wait_for_staleness(driver, first_row, timeout)
+    self._wait_for_melul_rows(driver, timeout)
+
+  def _wait_for_melul_rows(self, driver, timeout) -> bool:
+    return self._wait_until(
+        driver,
+        expected_conditions.presence_of_element_located((By.CSS_SELECTOR, MELUL_ROW_SELECTOR)),
+        timeout)
+
+  def _wait_for_staleness(self, driver, element, timeout) -> bool:
+    return self._wait_until(driver, expected_conditions.staleness_of(element), timeout)
+
+  def _wait_until(self, driver, condition, timeout) -> bool:
+    """ Waits for at most the timeout for the condition, returning whether it was met. """
+    try:
+      WebDriverWait(driver, timeout).until(condition)
+      return True
+    except TimeoutException:
+      return False
 
   def _login_oaks(self) -> Any: # fix later, webdriver
     group_config = self.config['groups']['oaks']
@@ -363,12 +554,13 @@ class GroupSiteManager:
     driver = self._login_oaks()
     try:
       driver.find_element_by_id('ContentPlaceHolder1_btnUpload').click()
-      time.sleep(1)
+      WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+          expected_conditions.presence_of_element_located((By.TAG_NAME, 'textarea')))
       # driver.send_keys() is way too slow; this is instant.
       js_input = '\\n'.join(numbers)
       driver.execute_script(f"document.getElementsByTagName('textarea')[0].value = '{js_input}';")
-      driver.find_element_by_id('ContentPlaceHolder1_btnGrabar').click()
-      time.sleep(2)
+      self._click_and_wait_for_staleness(
+          driver, driver.find_element_by_id('ContentPlaceHolder1_btnGrabar'), 2)
     finally:
       driver.quit()
 
@@ -390,20 +582,19 @@ class GroupSiteManager:
       driver.find_element_by_id("loginPassword").send_keys(group_config['password'])
       driver.find_element_by_xpath("//button[@type='submit']").click()
 
-      time.sleep(2)
-
       # hope there's a button to submit tracking numbers -- it doesn't matter which one
       try:
-        submit_button = driver.find_element_by_xpath("//button[text() = \"Submit tracking #'s\"]")
+        submit_button = WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+            expected_conditions.element_to_be_clickable(
+                (By.XPATH, "//button[text() = \"Submit tracking #'s\"]")))
         submit_button.click()
-      except NoSuchElementException:
+      except (NoSuchElementException, TimeoutException):
         raise Exception(
             "Could not find submit-trackings button. Make sure that you've subscribed to a deal and that the login credentials are correct"
         )
 
-      time.sleep(2)
-
-      modal = driver.find_element_by_class_name("modal-body")
+      modal = WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+          expected_conditions.visibility_of_element_located((By.CLASS_NAME, "modal-body")))
       form = modal.find_element_by_tag_name("form")
 
       textarea = form.find_element_by_class_name("textarea-control")
@@ -416,12 +607,12 @@ class GroupSiteManager:
       modal = driver.find_element_by_class_name("modal-body")
       if "Tracking number was already entered" in modal.text:
         dupes_list = form.find_element_by_css_selector('ul.error-message > li.ng-star-inserted')
-        dupe_numbers = dupes_list.text.strip().split(", ")
-        new_numbers = [n for n in numbers if not n in dupe_numbers]
+        dupe_numbers = set(dupes_list.text.strip().split(", "))
+        new_numbers = [n for n in numbers if n not in dupe_numbers]
         driver.find_element_by_class_name("modal-close").click()
         if len(new_numbers) > 0:
           # Re-run this batch with only new numbers, if there are any
-          self._upload_bfmr_batch(driver, new_numbers)
+          self._upload_bfmr_batch(new_numbers)
     finally:
       driver.quit()
 
@@ -474,13 +665,17 @@ class GroupSiteManager:
     self._load_page(driver, BASE_URL_FORMAT % group)
     driver.find_element_by_name(LOGIN_EMAIL_FIELD).send_keys(username)
     driver.find_element_by_name(LOGIN_PASSWORD_FIELD).send_keys(password)
-    driver.find_element_by_xpath(LOGIN_BUTTON_SELECTOR).click()
-    time.sleep(1)
+    self._click_and_wait_for_staleness(driver,
+                                       driver.find_element_by_xpath(LOGIN_BUTTON_SELECTOR), 1)
 
-    # Sometimes, they use two-factor auth
-    if "Authentication required" in driver.page_source:
+    # Sometimes, they use two-factor auth. The login view detaching doesn't mean the 2FA view
+    # has rendered yet, so wait for it to show up before deciding it isn't coming.
+    if self._wait_until(driver, lambda d: MELUL_TWO_FACTOR_TEXT in d.page_source,
+                        MELUL_TWO_FACTOR_WAIT_SECONDS):
       # ask for the email code
-      driver.find_element_by_css_selector("md-radio-button[value='email']").click()
+      WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(
+          expected_conditions.element_to_be_clickable(
+              (By.CSS_SELECTOR, "md-radio-button[value='email']"))).click()
       driver.find_element_by_css_selector("button[type='submit']").click()
       print(f"Solve the CAPTCHA for group {group}, then WAIT FOR THE 2FA EMAIL.")
       input("Press Return once the email has arrived (don't open it): ")
@@ -493,15 +688,17 @@ class GroupSiteManager:
       _, data = mail.uid("FETCH", last_id, "(RFC822)")
       msg = email.message_from_string(str(data[0][1], 'utf-8'))
       subject = msg['Subject']
-      pattern = r'Passcode for .*(\d{3}-\d{3})'
-      code = re.match(pattern, subject).group(1).replace('-', '')
+      code = PASSCODE_REGEX.match(subject).group(1).replace('-', '')
       print(f"Found passcode {code}, submitting ...")
 
       driver.find_element_by_css_selector('input[ui-mask="999-999"]').send_keys(code)
-      time.sleep(1)
       # The "Authenticate" button is the last button on the page.
-      driver.find_elements_by_css_selector("button[type='submit']")[-1].click()
-      time.sleep(1)
+      authenticate_button = driver.find_elements_by_css_selector("button[type='submit']")[-1]
+      WebDriverWait(driver, WAIT_TIMEOUT_SECONDS).until(lambda _: authenticate_button.is_enabled())
+      authenticate_button.click()
+      # Don't navigate away until the code has been accepted and the 2FA view is gone
+      self._wait_until(driver, lambda d: MELUL_TWO_FACTOR_TEXT not in d.page_source,
+                       WAIT_TIMEOUT_SECONDS)
 
     return driver
 
@@ -511,8 +708,10 @@ class GroupSiteManager:
     group_config = self.config['groups']['yrcw']
     driver.find_element_by_xpath("//input[@type='email']").send_keys(group_config['username'])
     driver.find_element_by_xpath("//input[@type='password']").send_keys(group_config['password'])
+    login_url = driver.current_url
     driver.find_element_by_xpath("//button[@type='submit']").click()
-    time.sleep(2)
+    # The form detaching doesn't mean the login went through; wait for the app to route away
+    self._wait_until(driver, expected_conditions.url_changes(login_url), WAIT_TIMEOUT_SECONDS)
     return driver
 
   def _get_all_mail_folder(self):
@@ -529,19 +728,20 @@ class GroupSiteManager:
     tracking_map = dict()
     result = collections.defaultdict(float)
 
-    for email_id in tqdm(email_ids, desc='Fetching BFMR check-ins', unit='email'):
-      email_str = email_tracking_retriever.get_email_content(email_id, mail)
-      email_str = email_tracking_retriever.clean_email_content(email_str)
-      soup = BeautifulSoup(email_str, features="html.parser")
-
-      body = soup.find('td', id='email_body')
-      if not body:
-        continue
-      tables = body.find_all('table')
-      if not tables or len(tables) < 2:
-        continue
-      table = tables[1]
-      fill_busted_bfmr_costs(result, tracking_map, table)
-      fill_standard_bfmr_costs(result, tracking_map, table)
+    # Fetch in batches (one UID FETCH each) to keep the command line within server limits; the
+    # CPU-bound parsing is spread across processes.
+    email_strs = []
+    for batch in tqdm(
+        list(util.chunks(email_ids, BFMR_FETCH_BATCH_SIZE)),
+        desc='Fetching BFMR emails',
+        unit='batch'):
+      email_strs.extend(email_tracking_retriever.get_email_contents(batch, mail))
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+      parsed_emails = executor.map(parse_bfmr_email, email_strs, chunksize=8)
+      for email_result, email_tracking_map in tqdm(
+          parsed_emails, desc='Parsing BFMR check-ins', unit='email', total=len(email_strs)):
+        for tracking, total in email_result.items():
+          result[tracking] += total
+        tracking_map.update(email_tracking_map)
 
     return tracking_map, result
@@ -1,11 +1,28 @@
 import pickle
 import os.path
+import threading
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 from lib.objects_to_drive import ObjectsToDrive
 from typing import Any
 
 OUTPUT_FOLDER = "output"
+# Protocol 4 (framed, compact set/dict opcodes) is the newest one Python 3.7 can read.
+PICKLE_PROTOCOL = 4
+BUFFER_SIZE = 1 << 20
+
+# flush often runs on @debounce timer threads, and the Drive client's httplib2 connection
+# isn't thread-safe, so each thread gets its own client.
+_thread_local = threading.local()
+
+
+def _get_objects_to_drive() -> ObjectsToDrive:
+  """ Lazily creates one authenticated Drive client per thread, shared by all retrievers. """
+  objects_to_drive = getattr(_thread_local, 'objects_to_drive', None)
+  if objects_to_drive is None:
+    objects_to_drive = ObjectsToDrive()
+    _thread_local.objects_to_drive = objects_to_drive
+  return objects_to_drive
 
 
 class ObjectRetriever:
@@ -21,17 +38,19 @@ class ObjectRetriever:
     if not os.path.exists(OUTPUT_FOLDER):
       os.mkdir(OUTPUT_FOLDER)
 
+    # Serialize in memory and swap the file into place so that a crash mid-write can't leave a
+    # truncated pickle behind.
     local_file = OUTPUT_FOLDER + "/" + filename
-    with open(local_file, 'wb') as stream:
-      pickle.dump(obj, stream)
+    temp_file = local_file + ".tmp"
+    with open(temp_file, 'wb') as stream:
+      stream.write(pickle.dumps(obj, protocol=PICKLE_PROTOCOL))
+    os.replace(temp_file, local_file)
 
-    objects_to_drive = ObjectsToDrive()
-    objects_to_drive.save(self.config, filename, local_file)
+    _get_objects_to_drive().save(self.config, filename, local_file)
 
   @retry(stop=stop_after_attempt(4), wait=wait_exponential(multiplier=1, min=2, max=120))
   def load(self, filename) -> Any:
-    objects_to_drive = ObjectsToDrive()
-    from_drive = objects_to_drive.load(self.config, filename)
+    from_drive = _get_objects_to_drive().load(self.config, filename)
     if from_drive:
       return from_drive
 
@@ -39,5 +58,5 @@ class ObjectRetriever:
     if not os.path.exists(local_file):
       return {}
 
-    with open(local_file, 'rb') as stream:
+    with open(local_file, 'rb', buffering=BUFFER_SIZE) as stream:
       return pickle.load(stream)
@@ -9,9 +9,15 @@ class ObjectsToSheet:
   def __init__(self) -> None:
     self.service = drive_service.create_sheets()
 
+  def download_from_sheet(self, from_row_fn, base_sheet_id, tab_title) -> list:
+    return self.download_all_from_sheet(
+        lambda header, values: [from_row_fn(header, value) for value in values], base_sheet_id,
+        tab_title)
+
   @retry(
       stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=16), reraise=True)
-  def download_from_sheet(self, from_row_fn, base_sheet_id, tab_title) -> list:
+  def download_all_from_sheet(self, from_rows_fn, base_sheet_id, tab_title) -> list:
+    """ Like download_from_sheet, but converts all rows with a single from_rows_fn call. """
     try:
       range = tab_title
       value_render_option = "UNFORMATTED_VALUE"
@@ -23,7 +29,7 @@ class ObjectsToSheet:
       header = result['values'][0]
       values = result['values'][1:]  # ignore the header
       self._extend_values_to_header(header, values)
-      return [from_row_fn(header, value) for value in values]
+      return from_rows_fn(header, values)
     except googleapiclient.errors.HttpError:
       # Tab doesn't exist
       self._create_tab(base_sheet_id, tab_title)
@@ -249,9 +249,8 @@ class ReconciliationUploader:
   def override_pos_and_costs(self, all_clusters):
     print("Filling manual PO adjustments")
     base_sheet_id = self.config['reconciliation']['baseSpreadsheetId']
-    downloaded_clusters = self.objects_to_sheet.download_from_sheet(clusters.from_row,
-                                                                    base_sheet_id,
-                                                                    "Reconciliation v2")
+    downloaded_clusters = self.objects_to_sheet.download_all_from_sheet(
+        clusters.from_rows, base_sheet_id, "Reconciliation v2")
 
     for cluster in all_clusters:
       candidate_downloads = self.find_candidate_downloads(cluster, downloaded_clusters)
@@ -277,8 +276,8 @@ class ReconciliationUploader:
 
   def fill_adjustments(self, all_clusters, base_sheet_id, tab_title) -> None:
     print("Filling in cost adjustments if applicable")
-    downloaded_clusters = self.objects_to_sheet.download_from_sheet(clusters.from_row,
-                                                                    base_sheet_id, tab_title)
+    downloaded_clusters = self.objects_to_sheet.download_all_from_sheet(
+        clusters.from_rows, base_sheet_id, tab_title)
 
     for cluster in all_clusters:
       candidate_downloads = self.find_candidate_downloads(cluster, downloaded_clusters)
@@ -298,6 +297,6 @@ class ReconciliationUploader:
   def find_candidate_downloads(self, cluster, downloaded_clusters) -> list:
     result = []
     for downloaded_cluster in downloaded_clusters:
-      if downloaded_cluster.trackings.intersection(cluster.trackings):
+      if not downloaded_cluster.trackings.isdisjoint(cluster.trackings):
         result.append(downloaded_cluster)
     return result
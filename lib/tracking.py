@@ -2,8 +2,12 @@ import datetime
 import re
 from typing import Any, List
 
+from lib import util
+
 
 class Tracking:
+  __slots__ = ('tracking_number', 'group', 'order_ids', 'price', 'to_email', 'ship_date',
+               'tracked_cost', 'items', 'merchant', 'reconcile', 'delivery_date')
 
   def __init__(self,
                tracking_number,
@@ -30,6 +34,11 @@ class Tracking:
     self.reconcile = reconcile
     self.delivery_date = delivery_date
 
+  def __getstate__(self) -> dict:
+    # Slotted objects have no __dict__; hand pickle the same name -> value state as before so
+    # that __setstate__ can load both old and new pickles.
+    return {name: getattr(self, name) for name in self.__slots__}
+
   def __setstate__(self, state) -> None:
     self.__init__(**state)
 
@@ -77,27 +86,37 @@ def convert_int_to_date(i):
   return (datetime.date(1900, 1, 1) + datetime.timedelta(int(i) - 2)).strftime("%Y-%m-%d")
 
 
+def from_rows(header, rows) -> List[Tracking]:
+  index = util.build_header_index(header)
+  return [_from_indexed_row(index, row) for row in rows]
+
+
 def from_row(header, row) -> Tracking:
-  tracking = row[header.index('Tracking Number')]
-  orders = set([s.strip() for s in str(row[header.index('Order Number(s)')]).split(',')])
-  price_str = str(row[header.index('Price')]).replace(',', '').replace(
-      '$', '') if 'Price' in header else ''
+  return _from_indexed_row(util.build_header_index(header), row)
+
+
+def _from_indexed_row(index, row) -> Tracking:
+  tracking = row[index['Tracking Number']]
+  orders = frozenset(
+      s for s in (x.strip() for x in str(row[index['Order Number(s)']]).split(',')) if s)
+  price_str = str(row[index['Price']]).translate(
+      util.MONEY_CHARS_TABLE) if 'Price' in index else ''
   price = float(price_str) if price_str else 0.0
-  to_email = row[header.index("To Email")]
-  ship_date = row[header.index("Ship Date")]
+  to_email = row[index["To Email"]]
+  ship_date = row[index["Ship Date"]]
 
   if isinstance(ship_date, int):
     ship_date = convert_int_to_date(ship_date)
 
-  delivery_date = row[header.index("Est. Delivery Date")] if "Est. Delivery Date" in header else ""
+  delivery_date = row[index["Est. Delivery Date"]] if "Est. Delivery Date" in index else ""
   if isinstance(delivery_date, int):
     delivery_date = convert_int_to_date(delivery_date)
 
-  group = row[header.index("Group")]
-  tracked_cost_str = row[header.index("Amount Reimbursed")] if "Amount Reimbursed" in header else ""
+  group = row[index["Group"]]
+  tracked_cost_str = row[index["Amount Reimbursed"]] if "Amount Reimbursed" in index else ""
   tracked_cost = float(tracked_cost_str) if tracked_cost_str else 0.0
-  items = row[header.index("Items")] if 'Items' in header else ""
-  merchant = row[header.index("Merchant")] if 'Merchant' in header else ""
+  items = row[index["Items"]] if 'Items' in index else ""
+  merchant = row[index["Merchant"]] if 'Merchant' in index else ""
   return Tracking(
       tracking,
       group,
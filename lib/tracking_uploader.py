@@ -13,9 +13,8 @@ class TrackingUploader:
     self.base_spreadsheet_id = config['reconciliation']['baseSpreadsheetId']
 
   def upload_trackings(self, trackings) -> None:
-    existing_trackings = self.objects_to_sheet.download_from_sheet(tracking.from_row,
-                                                                   self.base_spreadsheet_id,
-                                                                   "Trackings")
+    existing_trackings = self.objects_to_sheet.download_all_from_sheet(
+        tracking.from_rows, self.base_spreadsheet_id, "Trackings")
     existing_tracking_numbers = set(
         [existing_tracking.tracking_number for existing_tracking in existing_trackings])
     new_trackings = [t for t in trackings if t.tracking_number not in existing_tracking_numbers]
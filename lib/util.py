@@ -1,5 +1,9 @@
 import sys
 import traceback
+from typing import Dict, List
+
+# Use with str.translate() to strip '$' and ',' from a money amount in a single pass.
+MONEY_CHARS_TABLE = str.maketrans('', '', '$,')
 
 
 def get_traceback_lines() -> str:
@@ -18,3 +22,15 @@ def chunks(lst, n):
   """Yield successive n-sized chunks from lst."""
   for i in range(0, len(lst), n):
     yield lst[i:i + n]
+
+
+def build_header_index(header: List[str]) -> Dict[str, int]:
+  """
+  Maps each column name in a sheet header to its position, so that converting
+  many rows doesn't repeat a header.index() scan per field. Like header.index(),
+  the first occurrence of a duplicated name wins.
+  """
+  index = {}
+  for position, name in enumerate(header):
+    index.setdefault(name, position)
+  return index